@@ -5,6 +5,7 @@ from sqlite3 import Cursor
 
 from dataclasses import fields
 import json
+import zlib
 
 from .articles import Article
 from .preferences import Preference
@@ -17,6 +18,28 @@ TABLES = {
     'users'      :User,
 }
 
+# 本文など大きな列は別テーブルにzlib圧縮して保存し、一覧取得では読み込まない
+BODY_TABLES = {
+    'articles': ('article_bodies', ['content', 'summary']),
+}
+
+# 古いSQLiteのバインド変数の上限(999)を超えないよう、IN句に渡すキーの数を区切る
+BODY_CHUNK_SIZE = 500
+
+class _NotLoaded:
+    # 本文を読み込んでいないことを表す。''やNoneと区別し、set_docで書き戻しても本文を消さない
+    def __repr__(self):
+        return '<not loaded>'
+
+    # asdictはdeepcopyするので、コピーしても同じオブジェクトを返す
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+NOT_LOADED:Any = _NotLoaded()
+
 def get_sqlite_type(field_type: Type) -> str:
     type_map = {
         datetime: 'TEXT',
@@ -53,33 +76,171 @@ def parse_value(value: str):
     # その他のケースでは文字列のまま返す
     return value
 
-def setup_database(table_name:Optional[Union[str, List[str]]]=None):
+def compress_body(value: Optional[str]) -> Optional[bytes]:
+    if value is None:
+        return None
+    return zlib.compress(value.encode('utf-8'))
+
+def decompress_body(value: Optional[bytes]) -> Optional[str]:
+    if value is None:
+        return None
+    return zlib.decompress(value).decode('utf-8')
+
+def get_columns(table_name:str) -> List[str]:
+    # 本体テーブルに保存する列（別テーブルに切り出した本文列は除く）
+    body_columns = BODY_TABLES[table_name][1] if table_name in BODY_TABLES else []
+    return [f.name for f in fields(TABLES[table_name]) if f.name not in body_columns]
+
+def split_body(table_name:str, data:Dict[str,Any]) -> Tuple[Dict[str,Any], Dict[str,Any]]:
+    body_columns = BODY_TABLES[table_name][1] if table_name in BODY_TABLES else []
+    main = {key: value for key, value in data.items() if key not in body_columns}
+    body = {key: value for key, value in data.items() if key in body_columns and value is not NOT_LOADED}
+    return main, body
+
+def not_loaded_bodies(table_name:str) -> Dict[str,Any]:
+    body_columns = BODY_TABLES[table_name][1] if table_name in BODY_TABLES else []
+    return {col: NOT_LOADED for col in body_columns}
+
+def set_bodies(c:Cursor, table_name:str, bodies:List[Tuple[Union[str,int], Dict[str,Any]]]):
+    # bodiesは(キー, 本文列のdict)のリスト。行ごとに列が違ってもよいよう、列の組み合わせごとにまとめて書き込む
+    body_table, _ = BODY_TABLES[table_name]
+    key_name:str = fields(TABLES[table_name])[0].name
+
+    groups:Dict[Tuple[str,...], List[Tuple[Union[str,int], Dict[str,Any]]]] = {}
+    for key, body in bodies:
+        if body:
+            groups.setdefault(tuple(body.keys()), []).append((key, body))
+
+    for body_columns, rows in groups.items():
+        fieldNames = ', '.join([key_name] + list(body_columns))
+        placeholders = ', '.join(["?" for _ in range(len(body_columns) + 1)])
+        updates = ', '.join([f"{k} = excluded.{k}" for k in body_columns])
+        records = ( tuple([key] + [compress_body(body[k]) for k in body_columns]) for key, body in rows )
+        c.executemany(f'''INSERT INTO {body_table} ({fieldNames}) VALUES ({placeholders})
+                          ON CONFLICT({key_name}) DO UPDATE SET {updates}''', records)
+
+def load_bodies(table_name:str, ids:List[Union[str,int]], columns:Optional[List[str]]=None) -> Dict[Union[str,int], Dict[str,Optional[str]]]:
+    # 指定したキーの本文をBODY_CHUNK_SIZE件ずつまとめて取得する。columnsを指定すると、その列だけを展開する
+    body_table, body_columns = BODY_TABLES[table_name]
+    key_name:str = fields(TABLES[table_name])[0].name
+    columns = columns if columns is not None else body_columns
+    ids = list(ids)
+
+    bodies:Dict[Union[str,int], Dict[str,Optional[str]]] = {}
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
+        for i in range(0, len(ids), BODY_CHUNK_SIZE):
+            chunk = ids[i:i + BODY_CHUNK_SIZE]
+            placeholders = ', '.join([ "?" for e in chunk])
+            results = c.execute(f'''SELECT {key_name}, {', '.join(columns)} FROM {body_table} WHERE {key_name} IN ({placeholders})''', chunk)
+            for key, *values in results.fetchall():
+                bodies[key] = {name: decompress_body(value) for name, value in zip(columns, values)}
+    return bodies
+
+def attach_bodies(table_name:str, items:List[Any], columns:Optional[List[str]]=None) -> List[Any]:
+    # 取得済みのオブジェクトに本文をまとめて読み込む。本文がない行はフィールドのデフォルト値にする
+    key_name:str = fields(TABLES[table_name])[0].name
+    columns = columns if columns is not None else BODY_TABLES[table_name][1]
+    defaults = {f.name: f.default for f in fields(TABLES[table_name]) if f.name in columns}
+
+    bodies = load_bodies(table_name, [getattr(item, key_name) for item in items], columns)
+    for item in items:
+        body = bodies.get(getattr(item, key_name), {})
+        for name in columns:
+            setattr(item, name, body.get(name, defaults[name]))
+    return items
+
+def get_column_definitions(table_name:str) -> List[str]:
+    column_names = get_columns(table_name)
+    field_names = [f for f in fields(TABLES[table_name]) if f.name in column_names]
+
+    # 本文テーブルはlastrowidで紐づけるため、キーをrowidの別名(INTEGER PRIMARY KEY)にする
+    key_type = 'INTEGER' if table_name in BODY_TABLES else 'TEXT'
+
+    return [
+        f"{field.name} {get_sqlite_type(field.type)}" if i > 0 
+        else f"{field.name}  {key_type} PRIMARY KEY" 
+        for i, field in enumerate(field_names)  
+        ]
+
+def migrate_bodies(conn:sqlite3.Connection) -> bool:
+    # 本文列を本体テーブルに持つ古いDBを、圧縮した別テーブル方式に移行する
+    c = conn.cursor()
+    migrated = False
+    for table_name, (body_table, body_columns) in BODY_TABLES.items():
+        key_name:str = fields(TABLES[table_name])[0].name
+        table_info = c.execute(f"PRAGMA table_info({table_name})").fetchall()
+        existing = [row[1] for row in table_info]
+        old_columns = [col for col in body_columns if col in existing]
+
+        # 旧setup_databaseで作ったDBはキーがTEXT PRIMARY KEYで、row_numがNULLのまま保存されている
+        key_is_rowid = any(row[1] == key_name and row[2].upper() == 'INTEGER' and row[5] == 1 for row in table_info)
+        if not old_columns and key_is_rowid:
+            continue
+
+        # 本文はrowidをキーにしてコピーする（INTEGER PRIMARY KEYならrowid == row_num）
+        if old_columns:
+            rows = c.execute(f'''SELECT rowid, {', '.join(old_columns)} FROM {table_name}''').fetchall()
+            set_bodies(c, table_name, [ (key, dict(zip(old_columns, values))) for key, *values in rows ])
+
+        if key_is_rowid:
+            for col in old_columns:
+                c.execute(f"ALTER TABLE {table_name} DROP COLUMN {col}")
+        else:
+            # キーをINTEGER PRIMARY KEYにしてテーブルを作り直し、row_numにrowidを入れる
+            columns = [col for col in get_columns(table_name) if col in existing and col != key_name]
+            c.execute(f'''
+                CREATE TABLE {table_name}_new (
+                    {", ".join(get_column_definitions(table_name))}
+                )
+            ''')
+            c.execute(f'''INSERT INTO {table_name}_new ({', '.join([key_name] + columns)})
+                          SELECT rowid, {', '.join(columns)} FROM {table_name}''')
+            c.execute(f"DROP TABLE {table_name}")
+            c.execute(f"ALTER TABLE {table_name}_new RENAME TO {table_name}")
+        migrated = True
 
-        for table_name, the_class in TABLES.items():
-            field_names = fields(the_class)
+    return migrated
 
-            column_definitions = [
-                f"{field.name} {get_sqlite_type(field.type)}" if i > 0 
-                else f"{field.name}  TEXT PRIMARY KEY" 
-                for i, field in enumerate(field_names)  
-                ]
+def setup_database(table_name:Optional[Union[str, List[str]]]=None):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
 
+        for table_name, the_class in TABLES.items():
             c.execute(f'''
                 CREATE TABLE IF NOT EXISTS {table_name} (
-                    {", ".join(column_definitions)}
+                    {", ".join(get_column_definitions(table_name))}
                 )
             ''')
 
+            if table_name in BODY_TABLES:
+                body_table, body_columns = BODY_TABLES[table_name]
+                c.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {body_table} (
+                        {fields(the_class)[0].name} INTEGER PRIMARY KEY,
+                        {", ".join([f"{col} BLOB" for col in body_columns])}
+                    )
+                ''')
+
+        migrated = migrate_bodies(conn)
+
+    if migrated:
+        # 移行で空いた領域を回収する（VACUUMはトランザクション外で実行する必要がある）
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        conn.execute("VACUUM")
+        conn.close()
+
 def set_doc(table_name:str,data:Dict[str,str]):
     target_class = TABLES[table_name]
     key_name:str = fields(target_class)[0].name
 
+    # 本文列は別テーブルに保存する
+    data, body = split_body(table_name, data)
+
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
 
-        results = c.execute(f'''SELECT * FROM {table_name} WHERE {key_name} = ?''', (data[key_name],))
+        results = c.execute(f'''SELECT {key_name} FROM {table_name} WHERE {key_name} = ?''', (data.get(key_name),))
         record = results.fetchone()
 
         if record:
@@ -92,20 +253,39 @@ def set_doc(table_name:str,data:Dict[str,str]):
             print(values)
 
             # クエリの生成 例: UPDATE articles SET keywords = ? WHERE id = ?
-            query = f"UPDATE {table_name} SET {fieldNames} WHERE {key_name} = ?"
-            c.execute(query, values)
+            if fieldNames:
+                query = f"UPDATE {table_name} SET {fieldNames} WHERE {key_name} = ?"
+                c.execute(query, values)
+            key = data[key_name]
                                     
         else:
             fieldNames = ', '.join([f"{key}" for key in data.keys()])
             placeholders = ', '.join([f"?" for key in data.keys() ])
             values = [convert_value(value) for value in data.values()]
             c.execute(f"INSERT INTO {table_name} ({fieldNames}) VALUES ({placeholders})", values)
+            key = data.get(key_name) if data.get(key_name) is not None else c.lastrowid
+
+        set_bodies(c, table_name, [(key, body)])
 
 # OK
 def set_docs(table_name:str,data:List[Dict[str,Any]] ):
     the_class = TABLES[table_name]
     key_name:str = fields(the_class)[0].name
 
+    if table_name in BODY_TABLES:
+        # 本文は挿入した行のキー(lastrowid)で別テーブルに保存するため、本体は1件ずつ挿入する
+        with sqlite3.connect(DB_PATH) as conn:
+            c = conn.cursor()
+            bodies = []
+            for d in data:
+                main, body = split_body(table_name, d)
+                fieldNames = ', '.join([f"{key}" for key in main.keys()])
+                placeholders = ', '.join([f"?" for key in main.keys() ])
+                c.execute(f"INSERT INTO {table_name} ({fieldNames}) VALUES ({placeholders})", tuple(main.values()))
+                bodies.append((main.get(key_name) if main.get(key_name) is not None else c.lastrowid, body))
+            set_bodies(c, table_name, bodies)
+        return
+
     fieldNames = ', '.join([f"{key}" for key in data[0].keys()])
     placeholders = ', '.join([f"?" for key in data[0].keys() ])
     records = ( tuple(d.values()) for d in data )
@@ -116,55 +296,67 @@ def set_docs(table_name:str,data:List[Dict[str,Any]] ):
 
 
 #  OK
-def get_doc(table_name:str,id: Union[str,int] ):
+def get_doc(table_name:str,id: Union[str,int], with_body:bool=False ):
     the_class = TABLES[table_name]
     key_name:str = fields(the_class)[0].name
+    # 本文列はwith_body=Trueの時だけ別テーブルから読み込む
+    column_names = get_columns(table_name)
+    columns = ', '.join(column_names)
 
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
 
-        results = c.execute(f'''SELECT * FROM {table_name} WHERE {key_name} = ?''', (id,))
+        results = c.execute(f'''SELECT {columns} FROM {table_name} WHERE {key_name} = ?''', (id,))
         record = results.fetchone()
-        d:Dict = {f.name: convert_value(value) for f, value in zip(fields(the_class), record)}
-        return the_class(**d)
+        d:Dict = {name: convert_value(value) for name, value in zip(column_names, record)}
+
+    item = the_class(**d, **not_loaded_bodies(table_name))
+    if with_body and table_name in BODY_TABLES:
+        attach_bodies(table_name, [item])
+    return item
 
 
-def get_docs(table_name:str,query:Union[Tuple[str,str,Any],None]=None):
+def get_docs(table_name:str,query:Union[Tuple[str,str,Any],None]=None,with_body:bool=False):
     the_class = TABLES[table_name]
+    column_names = get_columns(table_name)
+    columns = ', '.join(column_names)
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
 
         results:Cursor
 
         if(query is None):
-            results = c.execute(f'''SELECT * FROM {table_name}''')
+            results = c.execute(f'''SELECT {columns} FROM {table_name}''')
 
         elif(query[1]=='=='):
-            results = c.execute(f'''SELECT * FROM {table_name} WHERE {query[0]} = ?''', (query[2],))
+            results = c.execute(f'''SELECT {columns} FROM {table_name} WHERE {query[0]} = ?''', (query[2],))
 
         elif(query[1]=='>'):
-            results = c.execute(f'''SELECT * FROM {table_name} WHERE {query[0]} > ?''', (query[2],))
+            results = c.execute(f'''SELECT {columns} FROM {table_name} WHERE {query[0]} > ?''', (query[2],))
 
         elif(query[1]=='>='):
-            results = c.execute(f'''SELECT * FROM {table_name} WHERE {query[0]} >= ?''', (query[2],))
+            results = c.execute(f'''SELECT {columns} FROM {table_name} WHERE {query[0]} >= ?''', (query[2],))
 
         elif(query[1]=='IN'):
             placeholders = ', '.join([ "?" for e in query[2]])
-            results = c.execute(f'''SELECT * FROM {table_name} WHERE {query[0]} IN ({placeholders})''', query[2])
+            results = c.execute(f'''SELECT {columns} FROM {table_name} WHERE {query[0]} IN ({placeholders})''', query[2])
 
         elif(query[1]=='NOT IN'):
             if query[2]==[]:
-                results = c.execute(f'''SELECT * FROM {table_name}''')
+                results = c.execute(f'''SELECT {columns} FROM {table_name}''')
             else:
                 placeholders = ', '.join([ f"?" for e in query[2]])
-                results = c.execute(f'''SELECT * FROM {table_name} WHERE {query[0]} NOT IN ({placeholders})''', query[2])
+                results = c.execute(f'''SELECT {columns} FROM {table_name} WHERE {query[0]} NOT IN ({placeholders})''', query[2])
 
         items = []
+        not_loaded = not_loaded_bodies(table_name)
         for values in results.fetchall():
-            d:Dict = {f.name: convert_value(value) for f, value in zip(fields(the_class), values)}
-            items.append(the_class(**d))
+            d:Dict = {name: convert_value(value) for name, value in zip(column_names, values)}
+            items.append(the_class(**d, **not_loaded))
 
-        return items
+    if with_body and table_name in BODY_TABLES:
+        attach_bodies(table_name, items)
+    return items
 
 def update_doc(table_name:str,data:Dict[str,Any]):
     pass
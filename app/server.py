@@ -18,7 +18,7 @@ from .Models.articles import Article
 from .Models.users import User
 from .Models.preferences import Preference
 
-from .Models.database import setup_database, get_doc, get_docs, set_doc, set_docs, update_doc
+from .Models.database import setup_database, get_doc, get_docs, set_doc, set_docs, update_doc, attach_bodies
 
 from dataclasses import asdict
 
@@ -68,7 +68,7 @@ def scrape_moe():
 @app.post("/extract_keywords_with_ai")
 async def extract_keywords_with_ai():
     # DBからデータ取り出し"
-    items:List[Article] = get_docs('articles',("keywords","==","[]"))
+    items:List[Article] = get_docs('articles',("keywords","==","[]"),with_body=True)
 
     # プロンプトの作成
     template = """
@@ -109,7 +109,7 @@ def set_score_to_articles()->None:
         # 記事一覧から、カレントユーザーの嗜好がまだ評価されていない記事を取り出す
         preferences_of_current_user:List[Preference] = get_docs("preferences",("user_id","==",user_id))
         graded_article_ids = [ p.article_id for p in preferences_of_current_user]
-        articles:List[Article] = get_docs("articles",("article_id","NOT IN",graded_article_ids))
+        articles:List[Article] = get_docs("articles",("article_id","NOT IN",graded_article_ids),with_body=True)
         
         # ユーザーの嗜好性に基づいて、記事をスコアリング
         template = """
@@ -171,8 +171,12 @@ async def articles(user_id:str, source:str, acquition_duration:int,ai_score:int,
     source = json.loads(source)    
     articles = [ a for a in articles if a.source in source ]
 
+    # 本文はsourceで絞り込んだ後の記事だけ、まとめて読み込む
+    attach_bodies("articles", articles)
+
     # wordでフィルタ
-    articles = [ a for a in articles if word in a.content ]
+    if word:
+        articles = [ a for a in articles if word in a.content ]
 
     # ユーザーの嗜好性を取得
     current_user_preferences:List[Preference] = get_docs("preferences",("user_id","==",user_id))
@@ -216,7 +220,7 @@ async def user_post(data:Dict):
 @app.get("/article")
 async def article(article_id:str):
     user_id = 1
-    article:Article = get_doc("articles",article_id)
+    article:Article = get_doc("articles",article_id,with_body=True)
     current_user_preferences:Preference = get_docs("preferences",("user_id",'==',user_id))
     preferences_dict = {pref.article_id: pref for pref in current_user_preferences}
     res = asdict(article) | {
@@ -0,0 +1,180 @@
+from dataclasses import asdict
+import sqlite3
+
+import pytest
+
+from app.Models import database
+from app.Models.articles import Article
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'sustainai.db')
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    return path
+
+
+def test_compress_body_round_trip():
+    text = '環境省は、風力発電事業に係る環境影響評価準備書に対する意見を提出しました。' * 20
+    compressed = database.compress_body(text)
+    assert isinstance(compressed, bytes)
+    assert len(compressed) < len(text.encode('utf-8'))
+    assert database.decompress_body(compressed) == text
+
+    assert database.compress_body(None) is None
+    assert database.decompress_body(None) is None
+
+
+def test_migrate_inline_bodies(db_path):
+    # 本文を本体テーブルに持っていた頃のスキーマ
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE articles (
+                row_num INTEGER PRIMARY KEY, article_id INTEGER, acquition_date TEXT,
+                publish_date TEXT, source TEXT, title TEXT, content TEXT, keywords TEXT,
+                summary TEXT, created_at TEXT, updated_at TEXT
+            )
+        ''')
+        conn.executemany(
+            "INSERT INTO articles (row_num, article_id, title, content, summary) VALUES (?, ?, ?, ?, ?)",
+            [(1, 'moe_01', 'タイトル1', '本文1', '要約1'), (2, 'moe_02', 'タイトル2', '本文2', None)],
+        )
+
+    database.setup_database()
+
+    with sqlite3.connect(db_path) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+    assert 'content' not in columns
+    assert 'summary' not in columns
+
+    docs = database.get_docs('articles', with_body=True)
+    assert [(d.row_num, d.title, d.content, d.summary) for d in docs] == [
+        (1, 'タイトル1', '本文1', '要約1'),
+        (2, 'タイトル2', '本文2', None),
+    ]
+
+    # 2回目は何もしない
+    database.setup_database()
+    assert [d.content for d in database.get_docs('articles', with_body=True)] == ['本文1', '本文2']
+
+
+def test_migrate_baseline_text_primary_key(db_path):
+    # 旧setup_databaseが作るスキーマ。row_numはTEXT PRIMARY KEYで、スクレイピングした行はNULLになる
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE articles (
+                row_num  TEXT PRIMARY KEY, article_id INTEGER, acquition_date TEXT,
+                publish_date TEXT, source TEXT, title TEXT, content TEXT, keywords TEXT,
+                summary TEXT, created_at TEXT, updated_at TEXT
+            )
+        ''')
+        conn.executemany(
+            "INSERT INTO articles (row_num, article_id, title, content, summary) VALUES (?, ?, ?, ?, ?)",
+            [(None, 'moe_01', 'タイトル1', '本文1', '要約1'), (None, 'moe_02', 'タイトル2', '本文2', None)],
+        )
+
+    database.setup_database()
+
+    with sqlite3.connect(db_path) as conn:
+        key = [row for row in conn.execute("PRAGMA table_info(articles)") if row[1] == 'row_num'][0]
+    assert key[2] == 'INTEGER' and key[5] == 1
+
+    docs = database.get_docs('articles', with_body=True)
+    assert [(d.article_id, d.title, d.content, d.summary) for d in docs] == [
+        ('moe_01', 'タイトル1', '本文1', '要約1'),
+        ('moe_02', 'タイトル2', '本文2', None),
+    ]
+    assert all(d.row_num is not None for d in docs)
+
+    # 移行後に追加した記事も読み戻せる
+    database.set_doc('articles', asdict(Article(article_id='moe_03', content='本文3')))
+    doc = database.get_docs('articles', ('article_id', '==', 'moe_03'), with_body=True)[0]
+    assert doc.content == '本文3'
+
+
+def test_set_doc_on_fresh_database(db_path):
+    database.setup_database()
+
+    article = Article(article_id='moe_01', title='タイトル', content='本文です', summary='要約です')
+    database.set_doc('articles', asdict(article))
+
+    docs = database.get_docs('articles', with_body=True)
+    assert len(docs) == 1
+    assert docs[0].row_num is not None
+    assert docs[0].content == '本文です'
+    assert docs[0].summary == '要約です'
+
+
+def test_get_docs_loads_body_only_when_requested(db_path):
+    database.setup_database()
+    database.set_doc('articles', asdict(Article(article_id='moe_01', content='本文1', summary='要約1')))
+    database.set_doc('articles', asdict(Article(article_id='moe_02', content='本文2', summary='要約2')))
+
+    docs = database.get_docs('articles')
+    assert [d.content for d in docs] == [database.NOT_LOADED, database.NOT_LOADED]
+    assert [d.summary for d in docs] == [database.NOT_LOADED, database.NOT_LOADED]
+
+    docs = database.get_docs('articles', with_body=True)
+    assert [d.content for d in docs] == ['本文1', '本文2']
+    assert [d.summary for d in docs] == ['要約1', '要約2']
+
+    doc = database.get_doc('articles', docs[1].row_num, with_body=True)
+    assert doc.content == '本文2'
+
+
+def test_attach_bodies_with_columns(db_path):
+    database.setup_database()
+    database.set_doc('articles', asdict(Article(article_id='moe_01', content='本文', summary='要約')))
+
+    docs = database.attach_bodies('articles', database.get_docs('articles'), ['summary'])
+    assert docs[0].summary == '要約'
+    assert docs[0].content is database.NOT_LOADED
+
+
+def test_set_docs_with_bodies(db_path):
+    database.setup_database()
+    database.set_docs('articles', [
+        {'article_id': 'moe_01', 'title': 'タイトル1', 'content': '本文1', 'summary': None},
+        {'article_id': 'moe_02', 'title': 'タイトル2', 'content': '本文2', 'summary': '要約2'},
+    ])
+
+    docs = database.get_docs('articles', with_body=True)
+    assert [d.title for d in docs] == ['タイトル1', 'タイトル2']
+    assert [d.content for d in docs] == ['本文1', '本文2']
+    assert [d.summary for d in docs] == [None, '要約2']
+
+
+def test_set_doc_keeps_body_when_not_loaded(db_path):
+    database.setup_database()
+    database.set_doc('articles', asdict(Article(article_id='moe_01', title='旧', content='本文', summary='要約')))
+
+    article = database.get_docs('articles')[0]
+    article.title = '新'
+    database.set_doc('articles', asdict(article))
+
+    doc = database.get_doc('articles', article.row_num, with_body=True)
+    assert doc.title == '新'
+    assert doc.content == '本文'
+    assert doc.summary == '要約'
+
+
+def test_set_docs_with_mixed_body_columns(db_path):
+    database.setup_database()
+    database.set_docs('articles', [
+        {'article_id': 'moe_01', 'title': 'タイトル1'},
+        {'article_id': 'moe_02', 'title': 'タイトル2', 'content': '本文2', 'summary': '要約2'},
+        {'article_id': 'moe_03', 'title': 'タイトル3', 'content': '本文3'},
+    ])
+
+    docs = database.get_docs('articles', with_body=True)
+    assert [d.content for d in docs] == ['', '本文2', '本文3']
+    assert [d.summary for d in docs] == [None, '要約2', None]
+
+
+def test_load_bodies_in_chunks(db_path, monkeypatch):
+    monkeypatch.setattr(database, 'BODY_CHUNK_SIZE', 2)
+    database.setup_database()
+    database.set_docs('articles', [ {'article_id': f'moe_{i}', 'content': f'本文{i}'} for i in range(5) ])
+
+    docs = database.get_docs('articles', with_body=True)
+    assert [d.content for d in docs] == [ f'本文{i}' for i in range(5) ]